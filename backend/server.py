@@ -1,13 +1,14 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, WebSocket, WebSocketDisconnect, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Set
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
@@ -15,6 +16,12 @@ import jwt
 from groq import Groq
 import json
 import re
+import asyncio
+import csv
+import io
+import zlib
+import time
+from collections import deque
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -32,6 +39,35 @@ JWT_EXPIRATION_HOURS = 24 * 7  # 1 week
 # Security
 security = HTTPBearer()
 
+# Dashboard push channel
+DASHBOARD_WS_QUEUE_SIZE = int(os.environ.get('DASHBOARD_WS_QUEUE_SIZE', '16'))
+DASHBOARD_WS_HEARTBEAT_SECONDS = float(os.environ.get('DASHBOARD_WS_HEARTBEAT_SECONDS', '25'))
+DASHBOARD_WS_SEND_TIMEOUT_SECONDS = float(os.environ.get('DASHBOARD_WS_SEND_TIMEOUT_SECONDS', '10'))
+DASHBOARD_WS_AUTH_TIMEOUT_SECONDS = float(os.environ.get('DASHBOARD_WS_AUTH_TIMEOUT_SECONDS', '10'))
+DASHBOARD_REFRESH_SECONDS = float(os.environ.get('DASHBOARD_REFRESH_SECONDS', '30'))
+
+# Bulk export
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', '1000'))
+EXPORT_CHUNK_BYTES = int(os.environ.get('EXPORT_CHUNK_BYTES', str(256 * 1024)))
+
+# Chat retention
+CHAT_HOT_DAYS = int(os.environ.get('CHAT_HOT_DAYS', '30'))
+CHAT_COMPACTION_INTERVAL_SECONDS = float(os.environ.get('CHAT_COMPACTION_INTERVAL_SECONDS', '3600'))
+
+# Chat model routing
+CHAT_LARGE_MODEL = os.environ.get('CHAT_LARGE_MODEL', 'llama-3.3-70b-versatile')
+CHAT_SMALL_MODEL = os.environ.get('CHAT_SMALL_MODEL', 'llama-3.1-8b-instant')
+CHAT_LARGE_BUDGET_SECONDS = float(os.environ.get('CHAT_LARGE_BUDGET_SECONDS', '15'))
+CHAT_SMALL_BUDGET_SECONDS = float(os.environ.get('CHAT_SMALL_BUDGET_SECONDS', '6'))
+CHAT_LATENCY_BUDGET_SECONDS = float(os.environ.get('CHAT_LATENCY_BUDGET_SECONDS', '20'))
+CHAT_SIMPLE_MAX_WORDS = int(os.environ.get('CHAT_SIMPLE_MAX_WORDS', '12'))
+CHAT_BREAKER_THRESHOLD = int(os.environ.get('CHAT_BREAKER_THRESHOLD', '5'))
+CHAT_BREAKER_RESET_SECONDS = float(os.environ.get('CHAT_BREAKER_RESET_SECONDS', '30'))
+
+# Request coalescing
+METRICS_FLIGHT_TIMEOUT_SECONDS = float(os.environ.get('METRICS_FLIGHT_TIMEOUT_SECONDS', '10'))
+CHAT_FLIGHT_TIMEOUT_SECONDS = float(os.environ.get('CHAT_FLIGHT_TIMEOUT_SECONDS', str(CHAT_LATENCY_BUDGET_SECONDS + 5)))
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -66,6 +102,8 @@ class ChatMessage(BaseModel):
     role: str
     content: str
     reasoning_steps: Optional[List[dict]] = None
+    route: Optional[str] = None
+    degraded: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class DashboardMetrics(BaseModel):
@@ -85,6 +123,10 @@ class SettingsUpdate(BaseModel):
     email_notifications: Optional[bool] = None
     report_schedule: Optional[str] = None
 
+class RetentionPolicy(BaseModel):
+    hot_days: int = Field(default=CHAT_HOT_DAYS, ge=1)
+    expire_days: Optional[int] = Field(default=None, ge=1)
+
 class Integration(BaseModel):
     id: str
     name: str
@@ -107,9 +149,8 @@ def create_token(user_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def authenticate_token(token: str) -> dict:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get('user_id')
         
@@ -122,6 +163,56 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    return await authenticate_token(credentials.credentials)
+
+# ========== REQUEST COALESCING ==========
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.inflight: Dict[tuple, asyncio.Task] = {}
+        self.upstream_calls = 0
+        self.saved_calls = 0
+        self.timeouts = 0
+
+    def _finished(self, key: tuple, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if task.cancelled():
+            return
+        if isinstance(task.exception(), asyncio.TimeoutError):
+            self.timeouts += 1
+
+    async def do(self, key: tuple, fn, timeout: Optional[float] = None):
+        task = self.inflight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            # The timeout bounds the shared work itself, so a hung call cannot pin the key
+            task = asyncio.ensure_future(asyncio.wait_for(fn(), timeout=timeout or self.timeout))
+            self.inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self.saved_calls += 1
+        # Shielded so one caller disconnecting does not cancel the work others are waiting on
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> dict:
+        return {
+            'upstream_calls': self.upstream_calls,
+            'saved_calls': self.saved_calls,
+            'timeouts': self.timeouts,
+            'inflight': len(self.inflight),
+        }
+
+metrics_flight = SingleFlight(METRICS_FLIGHT_TIMEOUT_SECONDS)
+chat_flight = SingleFlight(CHAT_FLIGHT_TIMEOUT_SECONDS)
+
+def _normalize_question(question: str) -> str:
+    return ' '.join(question.lower().split()).rstrip('?!. ')
+
 # ========== AUTH ROUTES ==========
 
 @api_router.post("/auth/signup", status_code=201)
@@ -163,8 +254,7 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 
 # ========== DASHBOARD ROUTES ==========
 
-@api_router.get("/dashboard/metrics", response_model=DashboardMetrics)
-async def get_metrics(current_user: dict = Depends(get_current_user)):
+async def compute_metrics(user: dict) -> DashboardMetrics:
     chart_data = [
         {"date": "Jan 1", "revenue": 12500},
         {"date": "Jan 3", "revenue": 13200},
@@ -221,6 +311,148 @@ async def get_metrics(current_user: dict = Depends(get_current_user)):
         anomalies=anomalies
     )
 
+async def shared_metrics(user: dict) -> DashboardMetrics:
+    return await metrics_flight.do(('metrics', user['id']), lambda: compute_metrics(user))
+
+def _metrics_delta(previous: dict, current: dict) -> dict:
+    """Return only what changed between two metrics payloads, or {} if nothing did."""
+    delta = {}
+    kpis = {
+        k: v for k, v in current.items()
+        if k not in ('chart_data', 'anomalies') and previous.get(k) != v
+    }
+    if kpis:
+        delta['kpis'] = kpis
+    if current['chart_data'] != previous['chart_data']:
+        delta['chart_data'] = current['chart_data']
+
+    upserted = [a for a in current['anomalies'] if a not in previous['anomalies']]
+    current_ids = {a['id'] for a in current['anomalies']}
+    removed = [a['id'] for a in previous['anomalies'] if a['id'] not in current_ids]
+    if upserted:
+        delta['anomalies'] = upserted
+    if removed:
+        delta['removed_anomalies'] = removed
+
+    if delta:
+        delta['type'] = 'delta'
+    return delta
+
+class DashboardConnection:
+    """One open dashboard socket. Kept deliberately small: a socket and a bounded queue."""
+    __slots__ = ('websocket', 'queue')
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=DASHBOARD_WS_QUEUE_SIZE)
+
+    def offer(self, event: dict, snapshot: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and let it resync from one full snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'snapshot', 'metrics': snapshot})
+
+class DashboardHub:
+    """Per-worker fan-out of dashboard deltas to every open socket of a user."""
+
+    def __init__(self):
+        self.connections: Dict[str, Set[DashboardConnection]] = {}
+        self.snapshots: Dict[str, dict] = {}
+
+    def subscribe(self, user_id: str, conn: DashboardConnection, metrics: dict) -> dict:
+        # Publish before joining so other tabs see fresh numbers and the new socket gets no redundant delta
+        self.publish(user_id, metrics)
+        self.snapshots.setdefault(user_id, metrics)
+        self.connections.setdefault(user_id, set()).add(conn)
+        return self.snapshots[user_id]
+
+    def unsubscribe(self, user_id: str, conn: DashboardConnection):
+        conns = self.connections.get(user_id)
+        if conns is None:
+            return
+        conns.discard(conn)
+        if not conns:
+            del self.connections[user_id]
+            self.snapshots.pop(user_id, None)
+
+    def publish(self, user_id: str, metrics: dict):
+        previous = self.snapshots.get(user_id)
+        if previous is None:
+            return
+        delta = _metrics_delta(previous, metrics)
+        if not delta:
+            return
+        self.snapshots[user_id] = metrics
+        for conn in self.connections.get(user_id, ()):
+            conn.offer(delta, metrics)
+
+dashboard_hub = DashboardHub()
+
+async def _refresh_dashboards():
+    """Recompute metrics once per connected user and push whatever changed."""
+    while True:
+        await asyncio.sleep(DASHBOARD_REFRESH_SECONDS)
+        for user_id in list(dashboard_hub.connections):
+            try:
+                metrics = await shared_metrics({'id': user_id})
+                dashboard_hub.publish(user_id, metrics.model_dump())
+            except Exception as e:
+                logging.error(f"Dashboard refresh error: {e}")
+
+async def _drain_client(websocket: WebSocket):
+    # Client frames (pongs) carry no data; reading them is how we notice disconnects
+    while True:
+        await websocket.receive_text()
+
+@api_router.get("/dashboard/metrics", response_model=DashboardMetrics)
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    metrics = await shared_metrics(current_user)
+    dashboard_hub.publish(current_user['id'], metrics.model_dump())
+    return metrics
+
+async def _authenticate_socket(websocket: WebSocket) -> Optional[dict]:
+    # The token arrives in the first frame rather than the URL so it never reaches access logs
+    try:
+        frame = await asyncio.wait_for(websocket.receive_json(), timeout=DASHBOARD_WS_AUTH_TIMEOUT_SECONDS)
+        if not isinstance(frame, dict) or frame.get('type') != 'auth':
+            return None
+        return await authenticate_token(str(frame.get('token', '')))
+    except (HTTPException, asyncio.TimeoutError, ValueError, KeyError):
+        return None
+
+@api_router.websocket("/dashboard/ws")
+async def dashboard_ws(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        user = await _authenticate_socket(websocket)
+    except WebSocketDisconnect:
+        return
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    user_id = user['id']
+    conn = DashboardConnection(websocket)
+    metrics = (await shared_metrics(user)).model_dump()
+    snapshot = dashboard_hub.subscribe(user_id, conn, metrics)
+    receiver = asyncio.create_task(_drain_client(websocket))
+    try:
+        await websocket.send_json({'type': 'snapshot', 'metrics': snapshot})
+        while not receiver.done():
+            try:
+                event = await asyncio.wait_for(conn.queue.get(), timeout=DASHBOARD_WS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                event = {'type': 'ping'}
+            await asyncio.wait_for(websocket.send_json(event), timeout=DASHBOARD_WS_SEND_TIMEOUT_SECONDS)
+    except (WebSocketDisconnect, asyncio.TimeoutError, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        dashboard_hub.unsubscribe(user_id, conn)
+
 # ========== CHAT ROUTES ==========
 
 def _generate_fallback_steps(question: str) -> List[dict]:
@@ -255,6 +487,186 @@ def _generate_fallback_steps(question: str) -> List[dict]:
             {"step": 4, "title": "Action Plan", "description": "Formulated specific recommendations based on the analysis"}
         ]
 
+def _parse_ai_response(ai_response: str, question: str) -> tuple:
+    try:
+        response_data = json.loads(ai_response)
+        content = response_data.get('summary', '')
+        reasoning_steps = response_data.get('reasoning_steps', [])
+    except:
+        json_match = re.search(r'\{[\s\S]*"reasoning_steps"[\s\S]*\}', ai_response)
+        if json_match:
+            try:
+                response_data = json.loads(json_match.group(0))
+                content = response_data.get('summary', ai_response)
+                reasoning_steps = response_data.get('reasoning_steps', [])
+            except:
+                content = ai_response
+                reasoning_steps = _generate_fallback_steps(question)
+        else:
+            content = ai_response
+            reasoning_steps = _generate_fallback_steps(question)
+    return content, reasoning_steps
+
+# Questions that ask for explanation or comparison need the large model
+COMPLEX_QUESTION_MARKERS = ('why', 'compare', 'forecast', 'predict', 'root cause', 'strategy', 'explain', 'versus', ' vs ')
+SIMPLE_QUESTION_KEYWORDS = ('mrr', 'revenue', 'churn', 'conversion', 'active users')
+
+DEGRADED_CHAT_SUMMARY = (
+    "Datalyn's AI analysis is temporarily unavailable, so this is an outline of how to investigate "
+    "your question. Try again in a minute for a full answer."
+)
+
+class CircuitBreaker:
+    """Stops calling a model after repeated failures, then lets a trial through once it cools down."""
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'closed':
+            return True
+        # Half-open admits exactly one probe; everyone else skips until it reports back
+        if state == 'half_open' and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def release(self):
+        # The caller went away mid-attempt, which proves nothing either way; free the probe slot
+        self.probing = False
+
+    def record_failure(self):
+        self.probing = False
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+def _percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 3)
+
+class RouteStats:
+    __slots__ = ('requests', 'failures', 'timeouts', 'latencies')
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.latencies: deque = deque(maxlen=500)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'p50_seconds': _percentile(ordered, 0.5),
+            'p95_seconds': _percentile(ordered, 0.95),
+        }
+
+class ModelRouter:
+    """Picks a Groq model per question and falls back across models within a latency budget."""
+
+    def __init__(self):
+        self.models = {'small': CHAT_SMALL_MODEL, 'large': CHAT_LARGE_MODEL}
+        self.budgets = {'small': CHAT_SMALL_BUDGET_SECONDS, 'large': CHAT_LARGE_BUDGET_SECONDS}
+        self.breakers = {r: CircuitBreaker(CHAT_BREAKER_THRESHOLD, CHAT_BREAKER_RESET_SECONDS) for r in self.models}
+        self.stats = {r: RouteStats() for r in (*self.models, 'local')}
+        self._client: Optional[Groq] = None
+
+    @property
+    def client(self) -> Groq:
+        if self._client is None:
+            # Retries are ours to make: the SDK's own would eat the latency budget
+            self._client = Groq(api_key=os.environ.get('GROQ_API_KEY'), max_retries=0)
+        return self._client
+
+    def plan(self, question: str) -> List[str]:
+        q = f" {question.lower()} "
+        if any(marker in q for marker in COMPLEX_QUESTION_MARKERS):
+            return ['large', 'small']
+        if len(question.split()) <= CHAT_SIMPLE_MAX_WORDS or any(k in q for k in SIMPLE_QUESTION_KEYWORDS):
+            return ['small', 'large']
+        return ['large', 'small']
+
+    def _create(self, route: str, messages: List[dict], timeout: float) -> str:
+        completion = self.client.chat.completions.create(
+            model=self.models[route],
+            messages=messages,
+            timeout=timeout
+        )
+        return completion.choices[0].message.content
+
+    async def complete(self, question: str, messages: List[dict]) -> tuple:
+        """Return (response text, route), or (None, 'local') when every model is unavailable."""
+        deadline = time.monotonic() + CHAT_LATENCY_BUDGET_SECONDS
+        for route in self.plan(question):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self.breakers[route].allow():
+                continue
+
+            budget = min(self.budgets[route], remaining)
+            stats = self.stats[route]
+            stats.requests += 1
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    asyncio.to_thread(self._create, route, messages, budget), timeout=budget
+                )
+            except asyncio.TimeoutError:
+                stats.timeouts += 1
+                self.breakers[route].record_failure()
+                logging.warning(f"Chat route {route} exceeded {budget:.1f}s budget")
+                continue
+            except asyncio.CancelledError:
+                self.breakers[route].release()
+                raise
+            except Exception as e:
+                stats.failures += 1
+                self.breakers[route].record_failure()
+                logging.error(f"Chat route {route} failed: {e}")
+                continue
+
+            stats.latencies.append(time.monotonic() - started)
+            self.breakers[route].record_success()
+            return response, route
+
+        self.stats['local'].requests += 1
+        return None, 'local'
+
+    def snapshot(self) -> dict:
+        return {
+            route: {
+                **stats.snapshot(),
+                'model': self.models.get(route),
+                'breaker': self.breakers[route].state if route in self.breakers else None
+            }
+            for route, stats in self.stats.items()
+        }
+
+model_router = ModelRouter()
+
 @api_router.post("/chat/message")
 async def send_message(msg: ChatMessageCreate, current_user: dict = Depends(get_current_user)):
     session_id = msg.session_id or str(uuid.uuid4())
@@ -268,15 +680,17 @@ async def send_message(msg: ChatMessageCreate, current_user: dict = Depends(get_
     )
     user_msg_dict = user_msg.model_dump()
     user_msg_dict['created_at'] = user_msg_dict['created_at'].isoformat()
+    _set_expiry(user_msg_dict, current_user, user_msg.created_at)
     await db.chat_messages.insert_one(user_msg_dict)
     
     try:
-        groq_client = Groq(api_key=os.environ.get('GROQ_API_KEY'))
-
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": """You are Datalyn, an expert business analyst AI. When analyzing business questions, provide structured reasoning.
+        # Identical questions from the same user share one completion while it is in flight
+        flight_key = ('chat', user_id, _normalize_question(msg.message))
+        try:
+            ai_response, route = await chat_flight.do(flight_key, lambda: model_router.complete(
+                msg.message,
+                [
+                    {"role": "system", "content": """You are Datalyn, an expert business analyst AI. When analyzing business questions, provide structured reasoning.
 
 CRITICAL: You MUST respond with ONLY valid JSON. No other text before or after.
 
@@ -292,38 +706,30 @@ Required JSON structure:
 }
 
 Use realistic SaaS metrics. Be specific with numbers and timeframes."""},
-                {"role": "user", "content": msg.message}
-            ]
-        )
-        ai_response = completion.choices[0].message.content
+                    {"role": "user", "content": msg.message}
+                ]
+            ))
+        except asyncio.TimeoutError:
+            ai_response, route = None, 'local'
 
-        try:
-            response_data = json.loads(ai_response)
-            content = response_data.get('summary', '')
-            reasoning_steps = response_data.get('reasoning_steps', [])
-        except:
-            json_match = re.search(r'\{[\s\S]*"reasoning_steps"[\s\S]*\}', ai_response)
-            if json_match:
-                try:
-                    response_data = json.loads(json_match.group(0))
-                    content = response_data.get('summary', ai_response)
-                    reasoning_steps = response_data.get('reasoning_steps', [])
-                except:
-                    content = ai_response
-                    reasoning_steps = _generate_fallback_steps(msg.message)
-            else:
-                content = ai_response
-                reasoning_steps = _generate_fallback_steps(msg.message)
+        if ai_response is None:
+            content = DEGRADED_CHAT_SUMMARY
+            reasoning_steps = _generate_fallback_steps(msg.message)
+        else:
+            content, reasoning_steps = _parse_ai_response(ai_response, msg.message)
         
         ai_msg = ChatMessage(
             session_id=session_id,
             user_id=user_id,
             role='assistant',
             content=content,
-            reasoning_steps=reasoning_steps
+            reasoning_steps=reasoning_steps,
+            route=route,
+            degraded=ai_response is None
         )
         ai_msg_dict = ai_msg.model_dump()
         ai_msg_dict['created_at'] = ai_msg_dict['created_at'].isoformat()
+        _set_expiry(ai_msg_dict, current_user, ai_msg.created_at)
         await db.chat_messages.insert_one(ai_msg_dict)
         
         return {
@@ -333,19 +739,34 @@ Use realistic SaaS metrics. Be specific with numbers and timeframes."""},
                 'role': 'assistant',
                 'content': content,
                 'reasoning_steps': reasoning_steps,
-                'created_at': ai_msg.created_at.isoformat()
+                'created_at': ai_msg.created_at.isoformat(),
+                'route': ai_msg.route,
+                'degraded': ai_msg.degraded
             }
         }
     except Exception as e:
         logging.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
+@api_router.get("/chat/routing/stats")
+async def get_routing_stats(current_user: dict = Depends(get_current_user)):
+    return {'routes': model_router.snapshot()}
+
+@api_router.get("/coalescing/stats")
+async def get_coalescing_stats(current_user: dict = Depends(get_current_user)):
+    return {'metrics': metrics_flight.snapshot(), 'chat': chat_flight.snapshot()}
+
 @api_router.get("/chat/history/{session_id}")
 async def get_chat_history(session_id: str, current_user: dict = Depends(get_current_user)):
     messages = await db.chat_messages.find(
         {'session_id': session_id, 'user_id': current_user['id']},
-        {'_id': 0}
+        {'_id': 0, 'expires_at': 0}
     ).sort('created_at', 1).to_list(1000)
+
+    archived = await _load_archived_messages(current_user['id'], session_id)
+    if archived:
+        hot_ids = {m['id'] for m in messages}
+        messages = [m for m in archived if m['id'] not in hot_ids] + messages
     
     for msg in messages:
         if isinstance(msg.get('created_at'), str):
@@ -368,6 +789,22 @@ async def get_sessions(current_user: dict = Depends(get_current_user)):
     ]
     
     sessions = await db.chat_messages.aggregate(pipeline).to_list(20)
+
+    # Compacted sessions only live in the archive; merge them in unless a hot copy exists
+    hot_ids = {s['_id'] for s in sessions}
+    archives = await db.chat_archives.find(
+        {'user_id': current_user['id']},
+        {'_id': 0, 'session_id': 1, 'last_message': 1, 'last_created_at': 1}
+    ).sort('last_created_at', -1).to_list(20)
+    sessions += [
+        {
+            '_id': a['session_id'],
+            'last_message': a['last_message'],
+            'last_updated': a['last_created_at'].replace(tzinfo=timezone.utc).isoformat()
+        }
+        for a in archives if a['session_id'] not in hot_ids
+    ]
+    sessions = sorted(sessions, key=lambda s: s['last_updated'], reverse=True)[:20]
     
     return {
         'sessions': [
@@ -380,6 +817,236 @@ async def get_sessions(current_user: dict = Depends(get_current_user)):
         ]
     }
 
+# ========== EXPORT ROUTES ==========
+
+EXPORT_COLUMNS = {
+    'metrics': [('metric', 'string'), ('date', 'string'), ('value', 'float64'), ('change', 'float64')],
+    'chat': [
+        ('id', 'string'), ('session_id', 'string'), ('role', 'string'), ('content', 'string'),
+        ('reasoning_steps', 'string'), ('route', 'string'), ('degraded', 'bool_'), ('created_at', 'string')
+    ],
+}
+
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+EXPORT_COMPRESSION = {
+    'gzip': ('.gz', 'application/gzip'),
+    'zstd': ('.zst', 'application/zstd'),
+}
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes back to the caller instead of keeping them."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        self.position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def _require_export_deps(fmt: str, compression: Optional[str]):
+    # pyarrow and zstandard are only needed by the formats that use them
+    try:
+        if fmt == 'parquet':
+            import pyarrow  # noqa: F401
+        if compression == 'zstd':
+            import zstandard  # noqa: F401
+    except ImportError as e:
+        raise HTTPException(status_code=400, detail=f"Export option unavailable: {e.name} is not installed")
+
+async def _batched(rows: AsyncIterator[dict]) -> AsyncIterator[List[dict]]:
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def _encode_csv(rows: AsyncIterator[dict], columns: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+async def _encode_ndjson(rows: AsyncIterator[dict], columns: List[str]) -> AsyncIterator[bytes]:
+    lines = []
+    size = 0
+    async for row in rows:
+        line = json.dumps({c: row.get(c) for c in columns}) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+            size = 0
+    yield ''.join(lines).encode('utf-8')
+
+async def _encode_parquet(rows: AsyncIterator[dict], columns: List[tuple]) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    # One row group per batch, flushed straight to the client
+    async for batch in _batched(rows):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+async def _compress(chunks: AsyncIterator[bytes], compression: Optional[str]) -> AsyncIterator[bytes]:
+    if compression is None:
+        async for chunk in chunks:
+            if chunk:
+                yield chunk
+        return
+
+    if compression == 'gzip':
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    else:
+        import zstandard
+        compressor = zstandard.ZstdCompressor().compressobj()
+
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+def _export_response(name: str, dataset: str, rows: AsyncIterator[dict], fmt: str,
+                     compression: Optional[str]) -> StreamingResponse:
+    _require_export_deps(fmt, compression)
+    columns = EXPORT_COLUMNS[dataset]
+    if fmt == 'parquet':
+        chunks = _encode_parquet(rows, columns)
+    elif fmt == 'ndjson':
+        chunks = _encode_ndjson(rows, [c for c, _ in columns])
+    else:
+        chunks = _encode_csv(rows, [c for c, _ in columns])
+
+    filename = f"{name}.{fmt}"
+    media_type = EXPORT_MEDIA_TYPES[fmt]
+    if compression:
+        suffix, media_type = EXPORT_COMPRESSION[compression]
+        filename += suffix
+
+    return StreamingResponse(
+        _compress(chunks, compression),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+async def _metric_rows(user: dict) -> AsyncIterator[dict]:
+    metrics = await shared_metrics(user)
+    today = datetime.now(timezone.utc).date().isoformat()
+    for kpi in ('mrr', 'active_users', 'conversions', 'churn_rate'):
+        yield {
+            'metric': kpi,
+            'date': today,
+            'value': float(getattr(metrics, kpi)),
+            'change': getattr(metrics, f"{kpi}_change")
+        }
+    for point in metrics.chart_data:
+        yield {'metric': 'revenue', 'date': point['date'], 'value': float(point['revenue']), 'change': None}
+
+def _chat_row(doc: dict) -> dict:
+    steps = doc.get('reasoning_steps')
+    created_at = doc.get('created_at')
+    return {
+        'id': doc.get('id'),
+        'session_id': doc.get('session_id'),
+        'role': doc.get('role'),
+        'content': doc.get('content'),
+        'reasoning_steps': json.dumps(steps) if steps is not None else None,
+        'route': doc.get('route'),
+        'degraded': doc.get('degraded', False),
+        'created_at': created_at.isoformat() if isinstance(created_at, datetime) else created_at
+    }
+
+async def _next_archive(archives) -> Optional[dict]:
+    try:
+        return await archives.next()
+    except StopAsyncIteration:
+        return None
+
+async def _chat_rows(query: dict) -> AsyncIterator[dict]:
+    # Archives and hot messages are both walked in session order and merged, so only one
+    # session's archive is decompressed at a time and its ids can be dropped from the hot side
+    archives = db.chat_archives.find(query, {'_id': 0}).sort('session_id', 1)
+    cursor = db.chat_messages.find(query, {'_id': 0}).sort(
+        [('session_id', 1), ('created_at', 1)]
+    ).batch_size(EXPORT_BATCH_ROWS)
+
+    archive = await _next_archive(archives)
+    session_id = None
+    archived_ids: Set[str] = set()
+    async for doc in cursor:
+        if doc['session_id'] != session_id:
+            session_id = doc['session_id']
+            archived_ids = set()
+            while archive is not None and archive['session_id'] <= session_id:
+                messages = _decode_archive(archive)
+                for message in messages:
+                    yield _chat_row(message)
+                if archive['session_id'] == session_id:
+                    archived_ids = {m['id'] for m in messages}
+                archive = await _next_archive(archives)
+        if doc['id'] not in archived_ids:
+            yield _chat_row(doc)
+
+    while archive is not None:
+        for message in _decode_archive(archive):
+            yield _chat_row(message)
+        archive = await _next_archive(archives)
+
+@api_router.get("/export/metrics")
+async def export_metrics(
+    fmt: str = Query('csv', alias='format', pattern='^(csv|ndjson|parquet)$'),
+    compression: Optional[str] = Query(None, pattern='^(gzip|zstd)$'),
+    current_user: dict = Depends(get_current_user)
+):
+    return _export_response('metrics', 'metrics', _metric_rows(current_user), fmt, compression)
+
+@api_router.get("/export/chat")
+async def export_chat(
+    session_id: Optional[str] = None,
+    fmt: str = Query('csv', alias='format', pattern='^(csv|ndjson|parquet)$'),
+    compression: Optional[str] = Query(None, pattern='^(gzip|zstd)$'),
+    current_user: dict = Depends(get_current_user)
+):
+    query = {'user_id': current_user['id']}
+    if session_id:
+        query['session_id'] = session_id
+    # session_id is caller-supplied; keep only header-safe characters in the filename
+    name = f"chat-{re.sub(r'[^A-Za-z0-9_-]', '', session_id)}" if session_id else 'chat'
+    return _export_response(name, 'chat', _chat_rows(query), fmt, compression)
+
 # ========== SETTINGS ROUTES ==========
 
 @api_router.get("/settings")
@@ -404,6 +1071,102 @@ async def update_settings(settings: SettingsUpdate, current_user: dict = Depends
     
     return {'message': 'Settings updated successfully'}
 
+# ========== RETENTION ==========
+
+def _retention_policy(user: dict) -> RetentionPolicy:
+    return RetentionPolicy(**(user.get('retention') or {}))
+
+def _set_expiry(doc: dict, user: dict, created_at: datetime):
+    expire_days = _retention_policy(user).expire_days
+    if expire_days:
+        doc['expires_at'] = created_at + timedelta(days=expire_days)
+
+def _decode_archive(archive: dict) -> List[dict]:
+    return json.loads(zlib.decompress(archive['payload']))
+
+async def _load_archived_messages(user_id: str, session_id: str) -> List[dict]:
+    archive = await db.chat_archives.find_one({'user_id': user_id, 'session_id': session_id}, {'_id': 0})
+    return _decode_archive(archive) if archive else []
+
+async def compact_session(user: dict, session_id: str):
+    """Fold a session's hot messages into its single compressed archive document."""
+    user_id = user['id']
+    hot = await db.chat_messages.find(
+        {'user_id': user_id, 'session_id': session_id},
+        {'_id': 0, 'expires_at': 0}
+    ).sort('created_at', 1).to_list(None)
+    if not hot:
+        return
+
+    archived = await _load_archived_messages(user_id, session_id)
+    hot_ids = [m['id'] for m in hot]
+    seen = set(hot_ids)
+    messages = [m for m in archived if m['id'] not in seen] + hot
+
+    last_created_at = datetime.fromisoformat(messages[-1]['created_at'])
+    archive = {
+        'user_id': user_id,
+        'session_id': session_id,
+        'message_count': len(messages),
+        'first_created_at': datetime.fromisoformat(messages[0]['created_at']),
+        'last_created_at': last_created_at,
+        'last_message': messages[-1]['content'],
+        'payload': zlib.compress(json.dumps(messages).encode('utf-8')),
+        'archived_at': datetime.now(timezone.utc)
+    }
+    _set_expiry(archive, user, last_created_at)
+
+    # Archive first, then delete: a crash in between leaves duplicates that rehydration drops by id
+    await db.chat_archives.replace_one({'user_id': user_id, 'session_id': session_id}, archive, upsert=True)
+    await db.chat_messages.delete_many({'user_id': user_id, 'session_id': session_id, 'id': {'$in': hot_ids}})
+
+async def compact_user_sessions(user: dict) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=_retention_policy(user).hot_days)
+    pipeline = [
+        {'$match': {'user_id': user['id']}},
+        {'$group': {'_id': '$session_id', 'last_created_at': {'$max': '$created_at'}}},
+        {'$match': {'last_created_at': {'$lt': cutoff.isoformat()}}}
+    ]
+    stale = await db.chat_messages.aggregate(pipeline).to_list(None)
+    for session in stale:
+        await compact_session(user, session['_id'])
+    return len(stale)
+
+async def _compact_chat_history():
+    while True:
+        await asyncio.sleep(CHAT_COMPACTION_INTERVAL_SECONDS)
+        async for user in db.users.find({}, {'_id': 0, 'id': 1, 'retention': 1}):
+            try:
+                await compact_user_sessions(user)
+            except Exception as e:
+                logging.error(f"Chat compaction error: {e}")
+
+@api_router.get("/settings/retention", response_model=RetentionPolicy)
+async def get_retention(current_user: dict = Depends(get_current_user)):
+    return _retention_policy(current_user)
+
+@api_router.put("/settings/retention", response_model=RetentionPolicy)
+async def update_retention(policy: RetentionPolicy, current_user: dict = Depends(get_current_user)):
+    user_id = current_user['id']
+    await db.users.update_one({'id': user_id}, {'$set': {'retention': policy.model_dump()}})
+
+    # Re-stamp TTL expiry on everything already stored so the new policy applies retroactively
+    if policy.expire_days:
+        ttl_ms = policy.expire_days * 24 * 60 * 60 * 1000
+        await db.chat_messages.update_many(
+            {'user_id': user_id},
+            [{'$set': {'expires_at': {'$add': [{'$dateFromString': {'dateString': '$created_at'}}, ttl_ms]}}}]
+        )
+        await db.chat_archives.update_many(
+            {'user_id': user_id},
+            [{'$set': {'expires_at': {'$add': ['$last_created_at', ttl_ms]}}}]
+        )
+    else:
+        await db.chat_messages.update_many({'user_id': user_id}, {'$unset': {'expires_at': ''}})
+        await db.chat_archives.update_many({'user_id': user_id}, {'$unset': {'expires_at': ''}})
+
+    return policy
+
 # ========== INTEGRATIONS ROUTES ==========
 
 @api_router.get("/integrations", response_model=List[Integration])
@@ -438,6 +1201,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Lets history and export walk a user's transcripts in index order instead of sorting in memory
+    await db.chat_messages.create_index([('user_id', 1), ('session_id', 1), ('created_at', 1)])
+    await db.chat_archives.create_index([('user_id', 1), ('session_id', 1)], unique=True)
+    # TTL only fires for documents whose owner opted into expiry (they carry expires_at)
+    await db.chat_messages.create_index('expires_at', expireAfterSeconds=0)
+    await db.chat_archives.create_index('expires_at', expireAfterSeconds=0)
+
+@app.on_event("startup")
+async def start_dashboard_refresh():
+    app.state.dashboard_refresh = asyncio.create_task(_refresh_dashboards())
+
+@app.on_event("startup")
+async def start_chat_compaction():
+    app.state.chat_compaction = asyncio.create_task(_compact_chat_history())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.dashboard_refresh.cancel()
+    app.state.chat_compaction.cancel()
     client.close()
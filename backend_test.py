@@ -132,6 +132,30 @@ class DatalynAPITester:
             self.log_result("Dashboard Metrics", False, str(response))
             return False
 
+    def test_dashboard_websocket(self):
+        """Test dashboard push channel sends an initial snapshot"""
+        try:
+            from websockets.sync.client import connect
+        except ImportError:
+            self.log_result("Dashboard WebSocket", False, "websockets package not installed")
+            return False
+
+        ws_url = self.base_url.replace('http', 'ws', 1)
+        try:
+            with connect(f"{ws_url}/dashboard/ws", open_timeout=30) as ws:
+                ws.send(json.dumps({'type': 'auth', 'token': self.token}))
+                event = json.loads(ws.recv(timeout=30))
+        except Exception as e:
+            self.log_result("Dashboard WebSocket", False, str(e))
+            return False
+
+        if event.get('type') == 'snapshot' and 'mrr' in event.get('metrics', {}):
+            self.log_result("Dashboard WebSocket", True)
+            return True
+        else:
+            self.log_result("Dashboard WebSocket", False, str(event))
+            return False
+
     def test_chat_message(self):
         """Test AI chat functionality"""
         success, response = self.make_request(
@@ -155,6 +179,28 @@ class DatalynAPITester:
             self.log_result("AI Chat Message", False, str(response))
             return False, None
 
+    def test_routing_stats(self):
+        """Test per-route chat latency stats"""
+        success, response = self.make_request('GET', '/chat/routing/stats')
+
+        if success and isinstance(response, dict) and {'small', 'large', 'local'} <= set(response.get('routes', {})):
+            self.log_result("Chat Routing Stats", True)
+            return True
+        else:
+            self.log_result("Chat Routing Stats", False, str(response))
+            return False
+
+    def test_coalescing_stats(self):
+        """Test request coalescing counters"""
+        success, response = self.make_request('GET', '/coalescing/stats')
+
+        if success and isinstance(response, dict) and all('saved_calls' in response.get(k, {}) for k in ('metrics', 'chat')):
+            self.log_result("Coalescing Stats", True)
+            return True
+        else:
+            self.log_result("Coalescing Stats", False, str(response))
+            return False
+
     def test_chat_history(self, session_id):
         """Test chat history retrieval"""
         if not session_id:
@@ -181,6 +227,26 @@ class DatalynAPITester:
             self.log_result("Chat Sessions", False, str(response))
             return False
 
+    def test_export_chat(self):
+        """Test streaming chat transcript export"""
+        url = f"{self.base_url}/export/chat?format=ndjson"
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        try:
+            response = self.session.get(url, headers=headers, stream=True, timeout=30)
+            lines = [line for line in response.iter_lines() if line]
+            rows = [json.loads(line) for line in lines]
+        except Exception as e:
+            self.log_result("Export Chat", False, str(e))
+            return False
+
+        if response.status_code == 200 and all('session_id' in row for row in rows):
+            self.log_result("Export Chat", True)
+            return True
+        else:
+            self.log_result("Export Chat", False, f"Status {response.status_code}")
+            return False
+
     def test_integrations(self):
         """Test integrations list"""
         success, response = self.make_request('GET', '/integrations')
@@ -253,6 +319,24 @@ class DatalynAPITester:
             self.log_result("Update Settings", False, str(response))
             return False
 
+    def test_retention_update(self):
+        """Test chat retention policy round-trip"""
+        success, response = self.make_request(
+            'PUT',
+            '/settings/retention',
+            {
+                'hot_days': 14,
+                'expire_days': None
+            }
+        )
+
+        if success and isinstance(response, dict) and response.get('hot_days') == 14:
+            self.log_result("Update Retention", True)
+            return True
+        else:
+            self.log_result("Update Retention", False, str(response))
+            return False
+
     def run_all_tests(self):
         """Run all API tests"""
         print("🧪 Starting Datalyn API Testing...")
@@ -272,6 +356,7 @@ class DatalynAPITester:
         # Dashboard tests
         print("\n📊 Dashboard Tests:")
         self.test_dashboard_metrics()
+        self.test_dashboard_websocket()
 
         # Chat tests  
         print("\n💬 AI Chat Tests:")
@@ -279,6 +364,9 @@ class DatalynAPITester:
         if chat_success:
             self.test_chat_history(session_id)
         self.test_chat_sessions()
+        self.test_routing_stats()
+        self.test_coalescing_stats()
+        self.test_export_chat()
 
         # Integration tests
         print("\n🔌 Integration Tests:")
@@ -290,6 +378,7 @@ class DatalynAPITester:
         print("\n⚙️ Settings Tests:")
         self.test_settings_get()
         self.test_settings_update()
+        self.test_retention_update()
 
         # Summary
         print("\n" + "="*60)
@@ -7,6 +7,23 @@ import Sidebar from '@/components/Sidebar';
 import { toast } from 'sonner';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+const WS_API = API.replace(/^http/, 'ws');
+
+const applyDelta = (current, delta) => {
+  if (!current) return current;
+  const next = { ...current, ...(delta.kpis || {}) };
+  if (delta.chart_data) next.chart_data = delta.chart_data;
+  if (delta.anomalies || delta.removed_anomalies) {
+    const removed = new Set(delta.removed_anomalies || []);
+    const upserted = new Map((delta.anomalies || []).map((a) => [a.id, a]));
+    const kept = current.anomalies
+      .filter((a) => !removed.has(a.id))
+      .map((a) => upserted.get(a.id) || a);
+    const keptIds = new Set(kept.map((a) => a.id));
+    next.anomalies = [...(delta.anomalies || []).filter((a) => !keptIds.has(a.id)), ...kept];
+  }
+  return next;
+};
 
 export default function Dashboard() {
   const [metrics, setMetrics] = useState(null);
@@ -14,7 +31,57 @@ export default function Dashboard() {
   const navigate = useNavigate();
 
   useEffect(() => {
-    fetchMetrics();
+    const token = localStorage.getItem('token');
+    if (!token) {
+      fetchMetrics();
+      return;
+    }
+
+    let socket;
+    let retryTimer;
+    let attempts = 0;
+    let closed = false;
+    let received = false;
+
+    const connect = () => {
+      socket = new WebSocket(`${WS_API}/dashboard/ws`);
+      socket.onopen = () => {
+        socket.send(JSON.stringify({ type: 'auth', token }));
+      };
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'snapshot') {
+          attempts = 0;
+          received = true;
+          setMetrics(data.metrics);
+          setLoading(false);
+        } else if (data.type === 'delta') {
+          setMetrics((current) => applyDelta(current, data));
+        } else if (data.type === 'ping') {
+          socket.send('pong');
+        }
+      };
+      socket.onclose = (event) => {
+        if (closed) return;
+        // If the socket never delivered a snapshot, load the page once over REST
+        if (!received) {
+          received = true;
+          fetchMetrics();
+        }
+        // 1008 means the token was rejected; retrying will not help
+        if (event.code === 1008) return;
+        const delay = Math.min(30000, 1000 * 2 ** attempts);
+        attempts += 1;
+        retryTimer = setTimeout(connect, delay);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      socket.close();
+    };
   }, []);
 
   const fetchMetrics = async () => {